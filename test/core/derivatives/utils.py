@@ -19,6 +19,20 @@ def get_available_devices():
     return devices
 
 
+def pinned_rand(size):
+    """Return a random CPU tensor, page-locked if CUDA is available.
+
+    Pinned memory allows asynchronous (``non_blocking=True``) copies to GPU.
+
+    Args:
+        size (tuple): Shape of the tensor.
+
+    Returns:
+        torch.Tensor: Random tensor.
+    """
+    return torch.rand(size, pin_memory=torch.cuda.is_available())
+
+
 def derivative_cls_for(module_cls):
     """Return the associated derivative class for a module.
 
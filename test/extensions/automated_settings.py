@@ -0,0 +1,63 @@
+"""Helpers to generate test settings for `test.extensions` programmatically.
+
+Convolution settings share the same structure: a convolution layer followed by
+``ReLU``, ``Flatten`` and a ``Linear`` layer mapping to 5 classes. The network
+prototypes are built once per ``(conv_class, conv_params, input_size)`` and
+copied for every test problem.
+"""
+
+import copy
+from functools import lru_cache
+
+import torch
+from test.core.derivatives.utils import classification_targets, pinned_rand
+
+
+@lru_cache(maxsize=None)
+def _make_simple_cnn(conv_class, conv_params, input_size):
+    """Build the prototype network for a simple CNN setting.
+
+    The prototype is created with a fixed seed and without touching the global
+    random number generator state. It stays an eager ``torch.nn.Module``, since
+    ``backpack.extend`` relies on module hooks that scripted modules skip.
+
+    Args:
+        conv_class (torch.nn.Module): Convolution layer class.
+        conv_params (tuple): Positional arguments for ``conv_class``.
+        input_size (tuple): Shape of the network input.
+
+    Returns:
+        torch.nn.Sequential: Prototype network.
+    """
+    with torch.random.fork_rng(), torch.no_grad():
+        torch.manual_seed(0)
+
+        conv = conv_class(*conv_params)
+        output = conv(torch.zeros(input_size))
+        output_size = output.numel() // output.shape[0]
+
+        return torch.nn.Sequential(
+            conv, torch.nn.ReLU(), torch.nn.Flatten(), torch.nn.Linear(output_size, 5)
+        )
+
+
+def make_simple_cnn_setting(input_size, conv_class, conv_params, reduction="sum"):
+    """Create a classification setting for a single convolution layer.
+
+    Args:
+        input_size (tuple): Shape of the network input.
+        conv_class (torch.nn.Module): Convolution layer class.
+        conv_params (tuple): Positional arguments for ``conv_class``.
+        reduction (str): Reduction of the cross-entropy loss.
+
+    Returns:
+        dict: Test setting.
+    """
+    return {
+        "input_fn": lambda: pinned_rand(input_size),
+        "module_fn": lambda: copy.deepcopy(
+            _make_simple_cnn(conv_class, conv_params, input_size)
+        ),
+        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction=reduction),
+        "target_fn": lambda: classification_targets((input_size[0],), 5),
+    }
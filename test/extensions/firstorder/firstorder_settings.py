@@ -17,37 +17,65 @@ Optional entries:
     "device" [list(torch.device)]: List of devices to run the test on.
     "id_prefix" (str): Prefix to be included in the test name.
     "seed" (int): seed for the random number for torch.rand
+
+Set the environment variable ``BACKPACK_FAST_TESTS=1`` to replace the inputs
+of the most memory-intensive 3d convolution settings by smaller ones (used
+on CI).
 """
 
+import os
 
+import numpy as np
 import torch
-from test.core.derivatives.utils import classification_targets, regression_targets
+from test.core.derivatives.utils import (
+    classification_targets,
+    get_available_devices,
+    pinned_rand,
+    regression_targets,
+)
+from test.extensions.automated_settings import make_simple_cnn_setting
+from torch.nn import (
+    Conv1d,
+    Conv2d,
+    Conv3d,
+    ConvTranspose1d,
+    ConvTranspose2d,
+    ConvTranspose3d,
+)
 
-FIRSTORDER_SETTINGS = []
+# let cuDNN pick its fastest (non-deterministic) convolution algorithms
+torch.backends.cudnn.benchmark = True
+torch.backends.cudnn.deterministic = False
+if hasattr(torch, "use_deterministic_algorithms"):
+    torch.use_deterministic_algorithms(False)
 
-###############################################################################
-#                                   examples                                  #
-###############################################################################
+FAST = os.environ.get("BACKPACK_FAST_TESTS") == "1"
 
-example = {
-    "input_fn": lambda: torch.rand(3, 10),
-    "module_fn": lambda: torch.nn.Sequential(torch.nn.Linear(10, 5)),
-    "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
-    "target_fn": lambda: classification_targets((3,), 5),
-    "device": [torch.device("cpu")],
-    "seed": 0,
-    "id_prefix": "example",
-}
-FIRSTORDER_SETTINGS.append(example)
 
-###############################################################################
-#                         test setting: Linear Layers                         #
-###############################################################################
+def _shape(full, fast):
+    """Return the reduced input shape ``fast`` in fast mode, else ``full``."""
+    return fast if FAST else full
 
-FIRSTORDER_SETTINGS += [
+
+FIRSTORDER_SETTINGS = [
+    ###########################################################################
+    #                                 examples                                #
+    ###########################################################################
+    {
+        "input_fn": lambda: pinned_rand((3, 10)),
+        "module_fn": lambda: torch.nn.Sequential(torch.nn.Linear(10, 5)),
+        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
+        "target_fn": lambda: classification_targets((3,), 5),
+        "device": get_available_devices(),
+        "seed": 0,
+        "id_prefix": "example",
+    },
+    ###########################################################################
+    #                       test setting: Linear Layers                       #
+    ###########################################################################
     # classification
     {
-        "input_fn": lambda: torch.rand(3, 10),
+        "input_fn": lambda: pinned_rand((3, 10)),
         "module_fn": lambda: torch.nn.Sequential(
             torch.nn.Linear(10, 7), torch.nn.Linear(7, 5)
         ),
@@ -55,7 +83,7 @@ FIRSTORDER_SETTINGS += [
         "target_fn": lambda: classification_targets((3,), 5),
     },
     {
-        "input_fn": lambda: torch.rand(3, 10),
+        "input_fn": lambda: pinned_rand((3, 10)),
         "module_fn": lambda: torch.nn.Sequential(
             torch.nn.Linear(10, 7), torch.nn.ReLU(), torch.nn.Linear(7, 5)
         ),
@@ -64,7 +92,7 @@ FIRSTORDER_SETTINGS += [
     },
     # Regression
     {
-        "input_fn": lambda: torch.rand(3, 10),
+        "input_fn": lambda: pinned_rand((3, 10)),
         "module_fn": lambda: torch.nn.Sequential(
             torch.nn.Linear(10, 7), torch.nn.Sigmoid(), torch.nn.Linear(7, 5)
         ),
@@ -74,289 +102,66 @@ FIRSTORDER_SETTINGS += [
 ]
 
 ###############################################################################
-#                         test setting: Convolutional Layers                  #
+#                     test setting: Convolutional Layers                      #
 ###############################################################################
 
-FIRSTORDER_SETTINGS += [
-    {
-        "input_fn": lambda: torch.rand(3, 3, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.Conv1d(3, 2, 2),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(12, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.Conv1d(3, 2, 2, bias=False),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(12, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 8),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.Conv1d(
-                3, 6, 2, stride=4, padding=2, padding_mode="zeros", dilation=3
-            ),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(18, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.Conv1d(3, 2, 2, padding=2, dilation=1, stride=2),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(10, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 2, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.Conv1d(2, 3, 2, padding=0, dilation=2, groups=1),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(15, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 7, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.Conv2d(3, 2, 2),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(72, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="mean"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 7, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.Conv2d(3, 2, 2, bias=False),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(72, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="mean"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 8, 8),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.Conv2d(
-                3, 6, 2, stride=4, padding=2, padding_mode="zeros", dilation=3
-            ),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(54, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="mean"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 7, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.Conv2d(3, 2, 2, padding=0, stride=2),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(18, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="mean"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 2, 7, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.Conv2d(2, 3, 2, padding=0, dilation=2),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(75, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="mean"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 2, 7, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.Conv3d(3, 2, 2),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(72, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 2, 7, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.Conv3d(3, 2, 2, bias=False),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(72, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 4, 8, 8),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.Conv3d(
-                3, 6, 2, padding=2, stride=4, dilation=3, padding_mode="zeros"
-            ),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(108, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 2, 7, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.Conv3d(3, 2, 2, dilation=1, padding=2, stride=3),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(64, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 2, 3, 7, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.Conv3d(2, 3, 2, dilation=2, padding=0),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(75, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.ConvTranspose1d(3, 2, 2),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(16, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.ConvTranspose1d(3, 2, 2, bias=False),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(16, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.ConvTranspose1d(3, 2, 2, padding=2, dilation=1, stride=2),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(20, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 2, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.ConvTranspose1d(2, 3, 2, padding=0, dilation=5, stride=3),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(72, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="sum"),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 7, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.ConvTranspose2d(3, 2, 2),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(128, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 3, 7, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.ConvTranspose2d(3, 2, 2, bias=False),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(128, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(3, 2, 9, 9),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.ConvTranspose2d(2, 4, 2, padding=0, dilation=2, groups=1),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(484, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(),
-        "target_fn": lambda: classification_targets((3,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(2, 3, 2, 7, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.ConvTranspose3d(3, 2, 2),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(384, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="mean"),
-        "target_fn": lambda: classification_targets((2,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(2, 3, 2, 7, 7),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.ConvTranspose3d(3, 2, 2, bias=False),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(384, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="mean"),
-        "target_fn": lambda: classification_targets((2,), 5),
-    },
-    {
-        "input_fn": lambda: torch.rand(2, 3, 5, 5, 5),
-        "module_fn": lambda: torch.nn.Sequential(
-            torch.nn.ConvTranspose3d(3, 2, 2, padding=2, dilation=2, stride=2),
-            torch.nn.ReLU(),
-            torch.nn.Flatten(),
-            torch.nn.Linear(686, 5),
-        ),
-        "loss_function_fn": lambda: torch.nn.CrossEntropyLoss(reduction="mean"),
-        "target_fn": lambda: classification_targets((2,), 5),
-    },
+# Columns: input shape, layer class, layer parameters, loss reduction with
+# - Conv(in, out, kernel, stride, padding, dilation, groups, bias)
+# - ConvTranspose(in, out, kernel, stride, padding, output_padding, groups,
+#                 bias, dilation)
+CONV_SPECS_DTYPE = [
+    ("in_shape", "O"),
+    ("layer", "O"),
+    ("args", "O"),
+    ("reduction", "O"),
 ]
+CONV_SPECS = np.array(
+    [
+        ((3, 3, 7), Conv1d, (3, 2, 2), "sum"),
+        ((3, 3, 7), Conv1d, (3, 2, 2, 1, 0, 1, 1, False), "sum"),
+        ((3, 3, 8), Conv1d, (3, 6, 2, 4, 2, 3), "sum"),
+        ((3, 3, 7), Conv1d, (3, 2, 2, 2, 2, 1), "sum"),
+        ((3, 2, 7), Conv1d, (2, 3, 2, 1, 0, 2), "sum"),
+        ((3, 3, 7, 7), Conv2d, (3, 2, 2), "mean"),
+        ((3, 3, 7, 7), Conv2d, (3, 2, 2, 1, 0, 1, 1, False), "mean"),
+        ((3, 3, 8, 8), Conv2d, (3, 6, 2, 4, 2, 3), "mean"),
+        ((3, 3, 7, 7), Conv2d, (3, 2, 2, 2, 0), "mean"),
+        ((3, 2, 7, 7), Conv2d, (2, 3, 2, 1, 0, 2), "mean"),
+        ((3, 3, 2, 7, 7), Conv3d, (3, 2, 2), "sum"),
+        ((3, 3, 2, 7, 7), Conv3d, (3, 2, 2, 1, 0, 1, 1, False), "sum"),
+        (_shape((3, 3, 4, 8, 8), (2, 3, 2, 4, 4)), Conv3d, (3, 6, 2, 4, 2, 3), "sum"),
+        ((3, 3, 2, 7, 7), Conv3d, (3, 2, 2, 3, 2, 1), "sum"),
+        ((3, 2, 3, 7, 7), Conv3d, (2, 3, 2, 1, 0, 2), "sum"),
+        ((3, 3, 7), ConvTranspose1d, (3, 2, 2), "sum"),
+        ((3, 3, 7), ConvTranspose1d, (3, 2, 2, 1, 0, 0, 1, False), "sum"),
+        ((3, 3, 7), ConvTranspose1d, (3, 2, 2, 2, 2, 0, 1, True, 1), "sum"),
+        ((3, 2, 7), ConvTranspose1d, (2, 3, 2, 3, 0, 0, 1, True, 5), "sum"),
+        ((3, 3, 7, 7), ConvTranspose2d, (3, 2, 2), "mean"),
+        ((3, 3, 7, 7), ConvTranspose2d, (3, 2, 2, 1, 0, 0, 1, False), "mean"),
+        ((3, 2, 9, 9), ConvTranspose2d, (2, 4, 2, 1, 0, 0, 1, True, 2), "mean"),
+        ((2, 3, 2, 7, 7), ConvTranspose3d, (3, 2, 2), "mean"),
+        ((2, 3, 2, 7, 7), ConvTranspose3d, (3, 2, 2, 1, 0, 0, 1, False), "mean"),
+        (
+            _shape((2, 3, 5, 5, 5), (2, 3, 3, 3, 3)),
+            ConvTranspose3d,
+            (3, 2, 2, 2, 2, 0, 1, True, 2),
+            "mean",
+        ),
+    ],
+    dtype=CONV_SPECS_DTYPE,
+)
+
+
+def conv_specs_for(layer_cls):
+    """Return the rows of ``CONV_SPECS`` that use ``layer_cls``.
+
+    Args:
+        layer_cls (torch.nn.Module): Convolution layer class.
+
+    Returns:
+        numpy.ndarray: Structured array with the matching specifications.
+    """
+    return CONV_SPECS[CONV_SPECS["layer"] == layer_cls]
+
+
+FIRSTORDER_SETTINGS += [make_simple_cnn_setting(*spec.item()) for spec in CONV_SPECS]
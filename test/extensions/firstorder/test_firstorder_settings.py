@@ -0,0 +1,49 @@
+"""Test the convolution specifications of the first-order settings."""
+
+from test.extensions.firstorder.firstorder_settings import CONV_SPECS, conv_specs_for
+
+import pytest
+from torch.nn import (
+    Conv1d,
+    Conv2d,
+    Conv3d,
+    ConvTranspose1d,
+    ConvTranspose2d,
+    ConvTranspose3d,
+)
+
+NUM_SPECS = {
+    Conv1d: 5,
+    Conv2d: 5,
+    Conv3d: 5,
+    ConvTranspose1d: 4,
+    ConvTranspose2d: 3,
+    ConvTranspose3d: 3,
+}
+
+
+@pytest.mark.parametrize(
+    "layer_cls", list(NUM_SPECS), ids=[cls.__name__ for cls in NUM_SPECS]
+)
+def test_conv_specs_for(layer_cls):
+    """Select exactly the specifications of one layer class."""
+    specs = conv_specs_for(layer_cls)
+
+    assert len(specs) == NUM_SPECS[layer_cls]
+    assert all(layer is layer_cls for layer in specs["layer"])
+
+
+def test_conv_specs_item():
+    """Rows convert back to hashable tuples that match the columns."""
+    assert len(CONV_SPECS) == sum(NUM_SPECS.values())
+
+    for idx, spec in enumerate(CONV_SPECS):
+        in_shape, layer, args, reduction = spec.item()
+
+        assert isinstance(in_shape, tuple) and isinstance(args, tuple)
+        hash((in_shape, layer, args, reduction))
+
+        assert in_shape == CONV_SPECS["in_shape"][idx]
+        assert layer is CONV_SPECS["layer"][idx]
+        assert args == CONV_SPECS["args"][idx]
+        assert reduction == CONV_SPECS["reduction"][idx]
@@ -86,7 +86,7 @@ class ExtensionsTestProblem:
         torch.manual_seed(self.seed)
 
         self.model = self.module_fn().to(self.device)
-        self.input = self.input_fn().to(self.device)
+        self.input = self.input_fn().to(self.device, non_blocking=True)
         self.target = self.target_fn().to(self.device)
         self.loss_function = self.loss_function_fn().to(self.device)
 
@@ -1,11 +1,18 @@
 """Test batch gradient computation of linear layer."""
 
-from torch import Tensor, allclose
+import pytest
+import torch
+from torch import allclose
 from torch.nn import Linear
 
 import backpack.extensions as new_ext
 from backpack import backpack, extend
 
+if hasattr(torch.testing, "assert_close"):
+    from torch.testing import assert_close
+else:
+    from torch.testing import assert_allclose as assert_close
+
 
 def ExtLinear(*args, **kwargs):
     return extend(Linear(*args, **kwargs))
@@ -15,63 +22,102 @@ def ExtLinear(*args, **kwargs):
 # Example problems definitions
 ##
 
+
+def _pinned(tensor):
+    """Page-lock a CPU tensor if CUDA is available for asynchronous copies."""
+    return tensor.pin_memory() if torch.cuda.is_available() else tensor
+
+
 # predefined weight matrix and bias
-weight = Tensor([[1, 2, 3], [4, 5, 6]]).float()
-bias = Tensor([7, 8]).float()
+weight = _pinned(torch.tensor([[1, 2, 3], [4, 5, 6]], dtype=torch.float32))
+bias = _pinned(torch.tensor([7, 8], dtype=torch.float32))
 in_features, out_features = 3, 2
 
 
 def make_lin_layer(LayerClass, in_features, out_features, weight, bias):
     layer = LayerClass(in_features=in_features, out_features=out_features)
-    layer.weight.data = weight
-    layer.bias.data = bias
+    with torch.no_grad():
+        layer.weight.copy_(weight, non_blocking=True)
+        layer.bias.copy_(bias, non_blocking=True)
     return layer
 
 
-lin = make_lin_layer(Linear, in_features, out_features, weight, bias)
-g_lin = make_lin_layer(ExtLinear, in_features, out_features, weight, bias)
-
-
 def loss_function(tensor):
     """Test loss function. Sum over squared entries."""
-    return ((tensor.view(-1)) ** 2).sum()
-
-
-EXAMPLE_1 = {
-    "in": Tensor([[1, 1, 1]]).float(),
-    "out": Tensor([[6 + 7, 15 + 8]]).float(),
-    "loss": 13 ** 2 + 23 ** 2,
-    "bias_grad": Tensor([2 * 13, 2 * 23]).float(),
-    "bias_grad_batch": Tensor([2 * 13, 2 * 23]).float(),
-    "weight_grad": Tensor([[26, 26, 26], [46, 46, 46]]).float(),
-    "weight_grad_batch": Tensor([[26, 26, 26], [46, 46, 46]]).float(),
-}
-
-EXAMPLE_2 = {
-    "in": Tensor([[1, 0, 1], [0, 1, 0]]).float(),
-    "out": Tensor([[4 + 7, 10 + 8], [2 + 7, 5 + 8]]).float(),
-    "loss": 11 ** 2 + 18 ** 2 + 9 ** 2 + 13 ** 2,
-    "bias_grad": Tensor([2 * (11 + 9), 2 * (18 + 13)]),
-    "bias_grad_batch": Tensor([[2 * 11, 2 * 18], [2 * 9, 2 * 13]]).float(),
-    "weight_grad": Tensor([[22, 18, 22], [36, 26, 36]]).float(),
-    "weight_grad_batch": Tensor(
-        [[[22, 0, 22], [36, 0, 36]], [[0, 18, 0], [0, 26, 0]]]
-    ).float(),
-}
+    flat = tensor.reshape(-1)
+    return torch.dot(flat, flat)
+
+
+def _t(data):
+    """Expected values with the dtype and device of the layer parameters."""
+    return torch.as_tensor(data, dtype=weight.dtype, device=weight.device)
+
+
+def _grads(inp, W, b):
+    """Expected gradients of ``loss_function`` for a linear layer.
+
+    The individual weight gradient is the outer product of the output gradient
+    ``2 * (inp @ W.T + b)`` and the input.
+    """
+    bias_grad_batch = 2 * (inp @ W.T + b)
+    weight_grad_batch = bias_grad_batch[:, :, None] * inp[:, None, :]
+    return {
+        "bias_grad": bias_grad_batch.sum(0),
+        "bias_grad_batch": bias_grad_batch,
+        "weight_grad": weight_grad_batch.sum(0),
+        "weight_grad_batch": weight_grad_batch,
+    }
+
+
+def _mk(inputs, out, loss):
+    """Build an example once. Tests only read the input, so it is never cloned."""
+    inp = _pinned(_t(inputs))
+    return {"in": inp, "out": _t(out), "loss": loss, **_grads(inp, weight, bias)}
+
+
+EXAMPLE_1 = _mk(
+    inputs=[[1, 1, 1]],
+    out=[[6 + 7, 15 + 8]],
+    loss=13 ** 2 + 23 ** 2,
+)
+
+EXAMPLE_2 = _mk(
+    inputs=[[1, 0, 1], [0, 1, 0]],
+    out=[[4 + 7, 10 + 8], [2 + 7, 5 + 8]],
+    loss=11 ** 2 + 18 ** 2 + 9 ** 2 + 13 ** 2,
+)
 
 EXAMPLES = [EXAMPLE_1, EXAMPLE_2]
+EXAMPLE_IDS = ["ex1", "ex2"]
+
+##
+# Fixtures
+##
+
+
+@pytest.fixture(scope="session")
+def lin():
+    return make_lin_layer(Linear, in_features, out_features, weight, bias)
+
+
+@pytest.fixture
+def g_lin():
+    """Fresh extended layer for every test, no gradients leak between tests."""
+    return make_lin_layer(ExtLinear, in_features, out_features, weight, bias)
+
 
 ##
 # Tests
 ##
 
 
-def test_forward():
+@pytest.mark.parametrize("ex", EXAMPLES, ids=EXAMPLE_IDS)
+def test_forward(ex, lin, g_lin):
     """Compare forward of torch.nn.Linear and backpack.
     Handles single-instance and batch mode."""
-    for ex in EXAMPLES:
-        input, result = ex["in"], ex["out"]
+    input, result = ex["in"], ex["out"]
 
+    with torch.no_grad():
         out_lin = lin(input)
         assert allclose(out_lin, result)
 
@@ -79,48 +125,39 @@ def test_forward():
         assert allclose(out_g_lin, result)
 
 
-def test_losses():
+@pytest.mark.parametrize("ex", EXAMPLES, ids=EXAMPLE_IDS)
+def test_losses(ex, g_lin):
     """Test output of loss function."""
-    for ex in EXAMPLES:  # input, loss in zip(inputs, losses):
+    with torch.no_grad():
         loss_val = loss_function(g_lin(ex["in"]))
-        assert loss_val.item() == ex["loss"]
+    assert loss_val.item() == ex["loss"]
 
 
-def test_grad():
+@pytest.mark.parametrize("ex", EXAMPLES, ids=EXAMPLE_IDS)
+def test_grad(ex, g_lin):
     """Test computation of bias/weight gradients."""
-    for ex in EXAMPLES:
-        input, b_grad, w_grad = ex["in"], ex["bias_grad"], ex["weight_grad"]
-
-        loss = loss_function(g_lin(input))
-        with backpack(new_ext.BatchGrad()):
-            loss.backward()
+    input, b_grad, w_grad = ex["in"], ex["bias_grad"], ex["weight_grad"]
 
-        assert allclose(g_lin.bias.grad, b_grad)
-        assert allclose(g_lin.weight.grad, w_grad)
+    loss = loss_function(g_lin(input))
+    with backpack(new_ext.BatchGrad()):
+        loss.backward()
 
-        del g_lin.bias.grad
-        del g_lin.weight.grad
+    assert_close(g_lin.bias.grad, b_grad, rtol=1e-5, atol=1e-5)
+    assert_close(g_lin.weight.grad, w_grad, rtol=1e-5, atol=1e-5)
 
 
-def test_grad_batch():
+@pytest.mark.parametrize("ex", EXAMPLES, ids=EXAMPLE_IDS)
+def test_grad_batch(ex, g_lin):
     """Test computation of bias/weight batch gradients."""
-    for ex in EXAMPLES:
-        input, b_grad_batch, w_grad_batch = (
-            ex["in"],
-            ex["bias_grad_batch"],
-            ex["weight_grad_batch"],
-        )
-
-        loss = loss_function(g_lin(input))
-        with backpack(new_ext.BatchGrad()):
-            loss.backward()
-
-        assert allclose(g_lin.bias.grad_batch, b_grad_batch), "{} ≠ {}".format(
-            g_lin.bias.grad_batch, b_grad_batch
-        )
-        assert allclose(g_lin.weight.grad_batch, w_grad_batch), "{} ≠ {}".format(
-            g_lin.weight.grad_batch, w_grad_batch
-        )
-
-        del g_lin.bias.grad
-        del g_lin.weight.grad
+    input, b_grad_batch, w_grad_batch = (
+        ex["in"],
+        ex["bias_grad_batch"],
+        ex["weight_grad_batch"],
+    )
+
+    loss = loss_function(g_lin(input))
+    with backpack(new_ext.BatchGrad()):
+        loss.backward()
+
+    assert_close(g_lin.bias.grad_batch, b_grad_batch, rtol=1e-5, atol=1e-5)
+    assert_close(g_lin.weight.grad_batch, w_grad_batch, rtol=1e-5, atol=1e-5)